@@ -1,7 +1,9 @@
 # app.py (updated with database authentication)
 import os
+import time
 import uuid
-from datetime import datetime
+import threading
+from datetime import date, datetime, timedelta
 from typing import List, Optional
 from fastapi import FastAPI, HTTPException, Query, Depends, Security, status
 from fastapi.middleware.cors import CORSMiddleware
@@ -20,6 +22,24 @@ DB_NAME = os.getenv("DB_NAME", "fundholdings")
 DB_USER = os.getenv("DB_USER", "funder")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 
+# Read replicas used for read-only queries, as a comma-separated list of hosts
+# (optionally host:port). When empty, all queries go to DB_HOST.
+DB_READ_HOSTS = [h.strip() for h in os.getenv("DB_READ_HOSTS", "").split(",") if h.strip()]
+# Seconds to wait when connecting to a replica before failing over
+DB_READ_CONNECT_TIMEOUT = int(os.getenv("DB_READ_CONNECT_TIMEOUT", "3"))
+# Seconds a replica is skipped after a failed connection attempt
+DB_READ_RETRY_AFTER = float(os.getenv("DB_READ_RETRY_AFTER", "30"))
+# Replicas further behind the primary than this many seconds are skipped like
+# failed ones (0 disables the check)
+DB_READ_MAX_LAG = float(os.getenv("DB_READ_MAX_LAG", "30"))
+# Seconds a replica's measured lag is trusted before it is checked again
+DB_READ_LAG_CHECK_INTERVAL = float(os.getenv("DB_READ_LAG_CHECK_INTERVAL", "5"))
+# Seconds after this process writes (API key changes) during which its
+# read-only queries stay on the primary (0 disables). Process-local: it does not
+# cover writes made by other API tasks/containers or by etf_processor. Admin
+# endpoints always use the primary regardless.
+READ_YOUR_WRITES_WINDOW = float(os.getenv("READ_YOUR_WRITES_WINDOW", "0"))
+
 # API authentication settings
 API_KEY_NAME = "X-API-Key"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
@@ -52,6 +72,26 @@ class FundResponse(BaseModel):
     issuer: str
     holdings: List[Holding] = []
 
+class FundHistoryResponse(BaseModel):
+    fund_id: str
+    fund_symbol: str
+    report_dates: List[str] = []
+
+class FundStats(BaseModel):
+    fund_id: str
+    fund_symbol: str
+    timestamp_reported: str
+    num_holdings: int
+    top10_weight: float
+    hhi: float
+    weight_sum: float
+
+class FundListResponse(BaseModel):
+    funds: List[FundStats] = []
+
+# Columns of fund_stats that fund listings may be sorted and filtered by
+FUND_STATS_SORT_KEYS = {"hhi", "top10_weight", "num_holdings"}
+
 class ApiKeyCreate(BaseModel):
     user_id: str
     description: str
@@ -63,16 +103,111 @@ class ApiKeyResponse(BaseModel):
     description: str
     created_at: datetime
 
-def get_db_connection():
-    """Create and return a database connection."""
+# Read routing state, shared across requests
+_read_lock = threading.Lock()
+_read_host_index = 0
+_read_host_down_until = {}  # host -> time.monotonic() before which it is skipped
+_read_host_lag_checked_at = {}  # host -> time.monotonic() of the last passing lag check
+_last_write_time = None
+
+# Seconds the replica's replayed data is behind the primary. A replica that has
+# replayed everything it received is caught up, as long as it is still streaming;
+# otherwise the age of the last replayed transaction is used.
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+             AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())::float8,
+                      'Infinity'::float8)
+    END AS lag_seconds
+"""
+
+def mark_write():
+    """Record that this process just committed a write, for the read-your-writes window."""
+    global _last_write_time
+    _last_write_time = time.monotonic()
+
+def _connect(host, **kwargs):
+    """Open a connection to host, which may be given as host:port."""
+    port = None
+    if ":" in host:
+        host, port = host.rsplit(":", 1)
+    return psycopg2.connect(
+        host=host,
+        port=port,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        cursor_factory=RealDictCursor,  # Returns results as dictionaries
+        **kwargs
+    )
+
+def _get_read_connection():
+    """Return a connection to a healthy read replica, or None if none is available.
+    
+    Replicas are tried round-robin. A replica that fails to connect, or lags the
+    primary by more than DB_READ_MAX_LAG seconds, is skipped for
+    DB_READ_RETRY_AFTER seconds before being tried again. Lag is measured at most
+    once every DB_READ_LAG_CHECK_INTERVAL seconds per replica.
+    """
+    global _read_host_index
+    with _read_lock:
+        start = _read_host_index
+        _read_host_index = (_read_host_index + 1) % len(DB_READ_HOSTS)
+    
+    now = time.monotonic()
+    for offset in range(len(DB_READ_HOSTS)):
+        host = DB_READ_HOSTS[(start + offset) % len(DB_READ_HOSTS)]
+        if _read_host_down_until.get(host, 0) > now:
+            continue
+        try:
+            conn = _connect(host, connect_timeout=DB_READ_CONNECT_TIMEOUT)
+        except psycopg2.Error as e:
+            print(f"Error connecting to read replica {host}, skipping it for {DB_READ_RETRY_AFTER}s: {e}")
+            _read_host_down_until[host] = now + DB_READ_RETRY_AFTER
+            continue
+        
+        if DB_READ_MAX_LAG > 0 and now - _read_host_lag_checked_at.get(host, float("-inf")) >= DB_READ_LAG_CHECK_INTERVAL:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(REPLICA_LAG_QUERY)
+                    lag_seconds = cur.fetchone()['lag_seconds']
+                conn.rollback()
+            except psycopg2.Error as e:
+                lag_seconds = None
+                print(f"Error checking lag of read replica {host}, skipping it for {DB_READ_RETRY_AFTER}s: {e}")
+            
+            if lag_seconds is None or lag_seconds > DB_READ_MAX_LAG:
+                if lag_seconds is not None:
+                    print(f"Read replica {host} is {lag_seconds:.0f}s behind, skipping it for {DB_READ_RETRY_AFTER}s")
+                _read_host_down_until[host] = now + DB_READ_RETRY_AFTER
+                _read_host_lag_checked_at.pop(host, None)
+                conn.close()
+                continue
+            _read_host_lag_checked_at[host] = now
+        
+        _read_host_down_until.pop(host, None)
+        return conn
+    return None
+
+def get_db_connection(read_only=False):
+    """Create and return a database connection.
+    
+    With read_only=True the connection goes to one of DB_READ_HOSTS when any are
+    configured, reachable and caught up, and falls back to the primary (DB_HOST)
+    otherwise, or while inside this process's read-your-writes window.
+    """
+    if read_only and DB_READ_HOSTS:
+        recent_write = (_last_write_time is not None and
+                        time.monotonic() - _last_write_time < READ_YOUR_WRITES_WINDOW)
+        if not recent_write:
+            conn = _get_read_connection()
+            if conn is not None:
+                return conn
+    
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            cursor_factory=RealDictCursor  # Returns results as dictionaries
-        )
+        conn = _connect(DB_HOST)
         return conn
     except psycopg2.Error as e:
         print(f"Error connecting to database: {e}")
@@ -230,6 +365,7 @@ def read_root():
 async def get_fund(
     symbol: str, 
     holdings: List[str] = Query(None, description="List of holding symbols to filter by"),
+    as_of: Optional[date] = Query(None, description="Return the latest holdings reported on or before this date (YYYY-MM-DD)"),
     user_info: dict = Depends(verify_api_key)
 ):
     """
@@ -237,14 +373,17 @@ async def get_fund(
     
     - symbol: The fund symbol (e.g., 'PLTL')
     - holdings: Optional list of specific holding symbols to filter by
+    - as_of: Optional date; holdings are taken from the latest report on or before it
+      instead of the latest report overall
     
     Requires API key authentication via X-API-Key header.
     """
     status_code = 200
-    request_params = {"symbol": symbol, "holdings": holdings}
+    request_params = {"symbol": symbol, "holdings": holdings,
+                      "as_of": as_of.isoformat() if as_of else None}
     
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(read_only=True)
         
         try:
             with conn.cursor() as cur:
@@ -269,12 +408,21 @@ async def get_fund(
                 if fund_response.get('inception_date'):
                     fund_response['inception_date'] = fund_response['inception_date'].isoformat()
                 
-                # Get latest report date for this fund
-                cur.execute("""
+                # Get latest report date for this fund, optionally as of a past date.
+                # Both forms are a single seek on idx_holdings_fund_id_reported.
+                latest_query = """
                     SELECT MAX(timestamp_reported) as latest_date
                     FROM holdings
                     WHERE fund_id = %s
-                """, (fund_response['fund_id'],))
+                """
+                latest_params = [fund_response['fund_id']]
+                
+                if as_of:
+                    # Reports are stamped at midnight, but include the whole as_of day
+                    latest_query += " AND timestamp_reported < %s"
+                    latest_params.append(as_of + timedelta(days=1))
+                
+                cur.execute(latest_query, latest_params)
                 
                 latest_date = cur.fetchone()['latest_date']
                 
@@ -330,6 +478,251 @@ async def get_fund(
             request_params=request_params
         )
 
+@app.get("/api/fund/{symbol}/history", response_model=FundHistoryResponse)
+async def get_fund_history(
+    symbol: str,
+    user_info: dict = Depends(verify_api_key)
+):
+    """
+    List the dates for which holdings reports are available for a fund, newest first.
+    
+    - symbol: The fund symbol (e.g., 'PLTL')
+    
+    Any of the returned dates can be passed as `as_of` to /api/fund/{symbol}.
+    Requires API key authentication via X-API-Key header.
+    """
+    status_code = 200
+    request_params = {"symbol": symbol}
+    
+    try:
+        conn = get_db_connection(read_only=True)
+        
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT fund_id, fund_symbol
+                    FROM fund_info
+                    WHERE fund_symbol = %s
+                """, (symbol.upper(),))
+                
+                fund_data = cur.fetchone()
+                
+                if not fund_data:
+                    status_code = 404
+                    raise HTTPException(status_code=404, detail=f"Fund with symbol {symbol} not found")
+                
+                # Walk the distinct report dates with one index seek per date
+                # (a "loose index scan"), rather than reading every holding row
+                cur.execute("""
+                    WITH RECURSIVE report_dates AS (
+                        SELECT MAX(timestamp_reported) AS timestamp_reported
+                        FROM holdings
+                        WHERE fund_id = %(fund_id)s
+                        UNION ALL
+                        SELECT (
+                            SELECT MAX(h.timestamp_reported)
+                            FROM holdings h
+                            WHERE h.fund_id = %(fund_id)s
+                            AND h.timestamp_reported < r.timestamp_reported
+                        )
+                        FROM report_dates r
+                        WHERE r.timestamp_reported IS NOT NULL
+                    )
+                    SELECT timestamp_reported
+                    FROM report_dates
+                    WHERE timestamp_reported IS NOT NULL
+                """, {"fund_id": fund_data['fund_id']})
+                
+                report_dates = [row['timestamp_reported'].isoformat() for row in cur.fetchall()]
+                
+                return {
+                    "fund_id": fund_data['fund_id'],
+                    "fund_symbol": fund_data['fund_symbol'],
+                    "report_dates": report_dates
+                }
+        finally:
+            conn.close()
+    except HTTPException as e:
+        status_code = e.status_code
+        raise
+    except Exception as e:
+        status_code = 500
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Log the API request
+        await log_api_request(
+            endpoint=f"/api/fund/{symbol}/history",
+            method="GET",
+            status_code=status_code,
+            user_info=user_info,
+            request_params=request_params
+        )
+
+def format_fund_stats(row):
+    """Convert a fund_stats row to a FundStats response dict."""
+    stats = dict(row)
+    stats['timestamp_reported'] = stats['timestamp_reported'].isoformat()
+    return stats
+
+@app.get("/api/fund/{symbol}/stats", response_model=FundStats)
+async def get_fund_stats(
+    symbol: str,
+    as_of: Optional[date] = Query(None, description="Return stats for the latest report on or before this date (YYYY-MM-DD)"),
+    user_info: dict = Depends(verify_api_key)
+):
+    """
+    Get concentration statistics for a fund's latest holdings report.
+    
+    - symbol: The fund symbol (e.g., 'PLTL')
+    - as_of: Optional date; stats are taken from the latest report on or before it
+    
+    Returns the number of holdings, the combined weight of the ten largest holdings,
+    the Herfindahl-Hirschman index (sum of squared weights) and the sum of all weights.
+    Requires API key authentication via X-API-Key header.
+    """
+    status_code = 200
+    request_params = {"symbol": symbol, "as_of": as_of.isoformat() if as_of else None}
+    
+    try:
+        conn = get_db_connection(read_only=True)
+        
+        try:
+            with conn.cursor() as cur:
+                # Index lookup of the fund by symbol, then a backward scan of the
+                # fund_stats primary key that stops at the first matching row
+                stats_query = """
+                    SELECT f.fund_id, f.fund_symbol, s.timestamp_reported,
+                           s.num_holdings, s.top10_weight, s.hhi, s.weight_sum
+                    FROM fund_info f
+                    JOIN fund_stats s ON s.fund_id = f.fund_id
+                    WHERE f.fund_symbol = %s
+                """
+                params = [symbol.upper()]
+                
+                if as_of:
+                    stats_query += " AND s.timestamp_reported < %s"
+                    params.append(as_of + timedelta(days=1))
+                
+                stats_query += " ORDER BY s.timestamp_reported DESC LIMIT 1"
+                
+                cur.execute(stats_query, params)
+                stats_data = cur.fetchone()
+                
+                if not stats_data:
+                    status_code = 404
+                    raise HTTPException(status_code=404, detail=f"No stats found for fund with symbol {symbol}")
+                
+                return format_fund_stats(stats_data)
+        finally:
+            conn.close()
+    except HTTPException as e:
+        status_code = e.status_code
+        raise
+    except Exception as e:
+        status_code = 500
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Log the API request
+        await log_api_request(
+            endpoint=f"/api/fund/{symbol}/stats",
+            method="GET",
+            status_code=status_code,
+            user_info=user_info,
+            request_params=request_params
+        )
+
+@app.get("/api/funds", response_model=FundListResponse)
+async def list_funds(
+    sort_by: str = Query("hhi", description="Stat to rank funds by: hhi, top10_weight or num_holdings"),
+    descending: bool = Query(True, description="Rank from highest to lowest"),
+    min_hhi: Optional[float] = Query(None),
+    max_hhi: Optional[float] = Query(None),
+    min_top10_weight: Optional[float] = Query(None),
+    max_top10_weight: Optional[float] = Query(None),
+    min_num_holdings: Optional[int] = Query(None),
+    max_num_holdings: Optional[int] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    user_info: dict = Depends(verify_api_key)
+):
+    """
+    List funds with the concentration statistics of their latest report,
+    e.g. funds ranked by concentration.
+    
+    - sort_by: 'hhi' (default), 'top10_weight' or 'num_holdings'
+    - descending: Rank from highest to lowest (default true)
+    - min_*/max_*: Optional inclusive bounds on hhi, top10_weight and num_holdings
+    - limit/offset: Paging
+    
+    Requires API key authentication via X-API-Key header.
+    """
+    status_code = 200
+    bounds = {
+        "hhi": (min_hhi, max_hhi),
+        "top10_weight": (min_top10_weight, max_top10_weight),
+        "num_holdings": (min_num_holdings, max_num_holdings),
+    }
+    request_params = {"sort_by": sort_by, "descending": descending, "limit": limit, "offset": offset}
+    for key, (low, high) in bounds.items():
+        if low is not None:
+            request_params[f"min_{key}"] = low
+        if high is not None:
+            request_params[f"max_{key}"] = high
+    
+    try:
+        if sort_by not in FUND_STATS_SORT_KEYS:
+            status_code = 400
+            raise HTTPException(status_code=400,
+                                detail=f"sort_by must be one of: {', '.join(sorted(FUND_STATS_SORT_KEYS))}")
+        
+        conn = get_db_connection(read_only=True)
+        
+        try:
+            with conn.cursor() as cur:
+                # Only each fund's latest report is considered, which the
+                # partial indexes on fund_stats cover
+                funds_query = """
+                    SELECT f.fund_id, f.fund_symbol, s.timestamp_reported,
+                           s.num_holdings, s.top10_weight, s.hhi, s.weight_sum
+                    FROM fund_stats s
+                    JOIN fund_info f ON f.fund_id = s.fund_id
+                    WHERE s.is_latest
+                """
+                params = []
+                
+                # Column names are fixed in code (sort_by was checked above), never taken from the request
+                for key, (low, high) in bounds.items():
+                    if low is not None:
+                        funds_query += f" AND s.{key} >= %s"
+                        params.append(low)
+                    if high is not None:
+                        funds_query += f" AND s.{key} <= %s"
+                        params.append(high)
+                
+                direction = "DESC" if descending else "ASC"
+                funds_query += f" ORDER BY s.{sort_by} {direction}, f.fund_symbol LIMIT %s OFFSET %s"
+                params.extend([limit, offset])
+                
+                cur.execute(funds_query, params)
+                return {"funds": [format_fund_stats(row) for row in cur.fetchall()]}
+        finally:
+            conn.close()
+    except HTTPException as e:
+        status_code = e.status_code
+        raise
+    except Exception as e:
+        status_code = 500
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Log the API request
+        await log_api_request(
+            endpoint="/api/funds",
+            method="GET",
+            status_code=status_code,
+            user_info=user_info,
+            request_params=request_params
+        )
+
 @app.post("/admin/api-keys", response_model=ApiKeyResponse)
 async def create_api_key(key_data: ApiKeyCreate):
     """
@@ -364,6 +757,7 @@ async def create_api_key(key_data: ApiKeyCreate):
             
             new_key = cur.fetchone()
             conn.commit()
+            mark_write()
             
             return dict(new_key)
     finally:
@@ -375,6 +769,7 @@ async def list_user_api_keys(user_id: str):
     List all API keys for a user (admin only endpoint).
     This should be protected further in production.
     """
+    # Primary, not a replica, so a key created or deactivated a moment ago shows up correctly
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
@@ -407,6 +802,7 @@ async def deactivate_api_key(key_id: str):
             
             deactivated = cur.fetchone()
             conn.commit()
+            mark_write()
             
             if not deactivated:
                 raise HTTPException(status_code=404, detail="API key not found")
@@ -0,0 +1,56 @@
+-- Migration script to add the fund_stats table and backfill it from existing holdings.
+-- New reports get their stats from etf_processor.py at ingest time.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS fund_stats (
+    fund_id VARCHAR(50) NOT NULL,
+    timestamp_reported TIMESTAMP NOT NULL,
+    num_holdings INTEGER NOT NULL,
+    top10_weight DECIMAL(10, 6) NOT NULL,
+    hhi DECIMAL(12, 10) NOT NULL,
+    weight_sum DECIMAL(10, 6) NOT NULL,
+    is_latest BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (fund_id, timestamp_reported),
+    FOREIGN KEY (fund_id) REFERENCES fund_info(fund_id)
+);
+
+-- Compute stats for every (fund, report date) already in holdings
+INSERT INTO fund_stats (fund_id, timestamp_reported, num_holdings, top10_weight, hhi, weight_sum)
+SELECT fund_id,
+       timestamp_reported,
+       COUNT(*),
+       SUM(percent) FILTER (WHERE weight_rank <= 10),
+       SUM(percent * percent),
+       SUM(percent)
+FROM (
+    SELECT fund_id, timestamp_reported, percent,
+           ROW_NUMBER() OVER (PARTITION BY fund_id, timestamp_reported ORDER BY percent DESC) AS weight_rank
+    FROM holdings
+) ranked
+GROUP BY fund_id, timestamp_reported
+ON CONFLICT (fund_id, timestamp_reported) DO NOTHING;
+
+-- Flag each fund's newest report
+UPDATE fund_stats s
+SET is_latest = (s.timestamp_reported = latest.timestamp_reported)
+FROM (
+    SELECT fund_id, MAX(timestamp_reported) AS timestamp_reported
+    FROM fund_stats
+    GROUP BY fund_id
+) latest
+WHERE s.fund_id = latest.fund_id;
+
+CREATE INDEX IF NOT EXISTS idx_fund_stats_latest_hhi ON fund_stats(hhi) WHERE is_latest;
+CREATE INDEX IF NOT EXISTS idx_fund_stats_latest_top10_weight ON fund_stats(top10_weight) WHERE is_latest;
+CREATE INDEX IF NOT EXISTS idx_fund_stats_latest_num_holdings ON fund_stats(num_holdings) WHERE is_latest;
+
+-- Fund lookups by symbol (used by /api/fund/{symbol}/stats and the other fund endpoints)
+CREATE INDEX IF NOT EXISTS idx_fund_info_fund_symbol ON fund_info(fund_symbol);
+
+COMMIT;
+
+ANALYZE fund_stats;
+
+-- Done
+SELECT 'Migration complete: fund_stats created for ' || COUNT(*) || ' fund reports' as result FROM fund_stats;
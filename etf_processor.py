@@ -3,8 +3,19 @@ import os
 import re
 import csv
 import psycopg2
-from datetime import datetime
+from psycopg2 import sql
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
 import glob
+import time
+import zlib
+import ctypes
+import ctypes.util
+import select
+import struct
+import tarfile
+import zipfile
+import argparse
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -17,9 +28,24 @@ DB_USER = os.getenv("DB_USER", "funder")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DATA_DIR = os.getenv("DATA_DIR", "./etf_data")
 
+# Watch mode settings: how often to check DATA_DIR (or pending files, when
+# inotify is used), and how long a new file must go unchanged before it is
+# treated as completely written
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "2"))
+WATCH_DEBOUNCE = float(os.getenv("WATCH_DEBOUNCE", "2"))
+
 # Regular expression to match filenames like 4220_PLTL-holdings.csv
 FILE_PATTERN = r"(\d+)_([A-Z]+)-holdings\.csv"
 
+# Precision of holdings.percent, which is DECIMAL(10, 4)
+STORED_PERCENT_PRECISION = Decimal("0.0001")
+
+# How far the holdings weights of a report may sum away from 100% before warning
+WEIGHT_SUM_TOLERANCE = Decimal("0.02")
+
+# Archive formats that can be ingested without extracting to disk
+ARCHIVE_SUFFIXES = (".zip", ".tar.gz", ".tgz")
+
 def parse_date(date_str):
     """Parse date from string format YYYY-MM-DD."""
     if not date_str or date_str.strip() == "":
@@ -45,9 +71,80 @@ def clean_string(s):
         return s.strip().strip('"\'')
     return s
 
+def compute_fund_stats(holdings):
+    """Compute concentration statistics for one fund report.
+    
+    Weights are fractions (0.0087 for 0.87%). The HHI is the sum of squared
+    weights, so it ranges from 1/num_holdings for an equal-weight fund up to 1.
+    
+    Weights are first rounded the way Postgres stores them in holdings.percent
+    and summed exactly, so the results match stats computed in SQL from the
+    stored holdings (as create_fund_stats_table.sql does).
+    """
+    weights = sorted(
+        (Decimal(repr(holding['percent'])).quantize(STORED_PERCENT_PRECISION, rounding=ROUND_HALF_UP)
+         for holding in holdings),
+        reverse=True
+    )
+    return {
+        'num_holdings': len(weights),
+        'top10_weight': sum(weights[:10]),
+        'hhi': sum(w * w for w in weights),
+        'weight_sum': sum(weights)
+    }
+
+def weight_sum_within_tolerance(stats):
+    """Return True if a report's weights sum to within WEIGHT_SUM_TOLERANCE of 100%."""
+    return abs(stats['weight_sum'] - 1) <= WEIGHT_SUM_TOLERANCE
+
+def ensure_holdings_partition(conn, timestamp_reported):
+    """Create the yearly holdings partition for a report date if it is missing.
+    
+    Rows without a yearly partition land in holdings_default, and once they are
+    there the partition for their year can no longer be created, so this must
+    run before the rows are inserted. Does nothing if holdings is not partitioned.
+    
+    CREATE TABLE ... PARTITION OF locks holdings against all readers, so it is
+    committed in its own short transaction rather than held for the whole
+    load. Call it with no other transaction open on conn.
+    """
+    year = timestamp_reported.year
+    partition = f"holdings_{year}"
+    
+    with conn.cursor() as cur:
+        # Catalog lookups first, so the lock is only needed the first time a year is seen
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = 'holdings'::regclass")
+        if cur.fetchone()[0] == 'p':
+            cur.execute("SELECT to_regclass(%s)", (partition,))
+            if cur.fetchone()[0] is None:
+                cur.execute(sql.SQL("""
+                    CREATE TABLE IF NOT EXISTS {} PARTITION OF holdings
+                    FOR VALUES FROM (%s) TO (%s)
+                """).format(sql.Identifier(partition)), (date(year, 1, 1), date(year + 1, 1, 1)))
+                print(f"Created holdings partition {partition}")
+    
+    conn.commit()
+
 def process_file(conn, filepath):
     """Process a single ETF holdings file and update the database."""
     filename = os.path.basename(filepath)
+    
+    # Get file modification time for timestamp_observed
+    file_mtime = os.path.getmtime(filepath)
+    timestamp_observed = datetime.fromtimestamp(file_mtime)
+    
+    with open(filepath, 'r', encoding='utf-8') as f:
+        content = f.read()
+    
+    process_content(conn, filename, content, timestamp_observed)
+
+def process_content(conn, filename, content, timestamp_observed):
+    """Process the text of one ETF holdings file and update the database.
+    
+    The filename is only used for its fund id and symbol, so the content may
+    come from a loose file on disk or from a member of an archive.
+    """
+    filename = os.path.basename(filename)
     match = re.match(FILE_PATTERN, filename)
     if not match:
         print(f"Skipping file {filename} - doesn't match expected pattern")
@@ -55,66 +152,60 @@ def process_file(conn, filepath):
 
     fund_id, fund_symbol = match.groups()
     
-    # Get file modification time for timestamp_observed
-    file_mtime = os.path.getmtime(filepath)
-    timestamp_observed = datetime.fromtimestamp(file_mtime)
-    
     fund_info = {}
     holdings = []
     timestamp_reported = None
     
     # Parse the file
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-        lines = content.split('\n')
+    lines = content.split('\n')
+    
+    # Extract fund information from header
+    for line in lines[:15]:  # Check first 15 lines for header info
+        # Clean the line first - remove quotes around the entire line
+        line = clean_string(line)
         
-        # Extract fund information from header
-        for line in lines[:15]:  # Check first 15 lines for header info
-            # Clean the line first - remove quotes around the entire line
-            line = clean_string(line)
+        # Skip empty lines
+        if not line:
+            continue
             
-            # Skip empty lines
-            if not line:
-                continue
+        # Check for lines with the format "Key: Value"
+        if ":" in line:
+            # Split only on the first colon
+            parts = line.split(':', 1)
+            if len(parts) == 2:
+                key = clean_string(parts[0])
+                value = clean_string(parts[1])
                 
-            # Check for lines with the format "Key: Value"
-            if ":" in line:
-                # Split only on the first colon
-                parts = line.split(':', 1)
-                if len(parts) == 2:
-                    key = clean_string(parts[0])
-                    value = clean_string(parts[1])
-                    
-                    if key == fund_symbol:
-                        fund_info['fund_name'] = value
-                    elif key == "Inception Date":
-                        fund_info['inception_date'] = parse_date(value)
-                    elif key == "Fund Holdings as of":
-                        parsed_date = parse_date(value)
-                        if parsed_date:
-                            timestamp_reported = datetime.combine(parsed_date, datetime.min.time())
-                    elif key == "Issuer":
-                        fund_info['issuer'] = value
-        
-        # Extract holdings data
-        in_holdings = False
-        reader = None
-        for i, line in enumerate(lines):
-            if "Holding,Symbol,Weighting" in line:  # Look for the header row
-                in_holdings = True
-                # Use remaining lines for CSV reading
-                reader = csv.reader(lines[i+1:])
-                break
-        
-        if reader:
-            for row in reader:
-                if len(row) >= 3 and row[0] and row[1] and row[2]:  # Make sure we have all fields
-                    holdings.append({
-                        'holding_name': clean_string(row[0]),
-                        'holding_symbol': clean_string(row[1]),
-                        'percent': parse_percentage(row[2])
-                    })
+                if key == fund_symbol:
+                    fund_info['fund_name'] = value
+                elif key == "Inception Date":
+                    fund_info['inception_date'] = parse_date(value)
+                elif key == "Fund Holdings as of":
+                    parsed_date = parse_date(value)
+                    if parsed_date:
+                        timestamp_reported = datetime.combine(parsed_date, datetime.min.time())
+                elif key == "Issuer":
+                    fund_info['issuer'] = value
     
+    # Extract holdings data
+    in_holdings = False
+    reader = None
+    for i, line in enumerate(lines):
+        if "Holding,Symbol,Weighting" in line:  # Look for the header row
+            in_holdings = True
+            # Use remaining lines for CSV reading
+            reader = csv.reader(lines[i+1:])
+            break
+    
+    if reader:
+        for row in reader:
+            if len(row) >= 3 and row[0] and row[1] and row[2]:  # Make sure we have all fields
+                holdings.append({
+                    'holding_name': clean_string(row[0]),
+                    'holding_symbol': clean_string(row[1]),
+                    'percent': parse_percentage(row[2])
+                })
+
     # Check if we have all required fund info
     missing_info = []
     if not fund_info.get('fund_name'):
@@ -131,6 +222,9 @@ def process_file(conn, filepath):
         print(f"Warning: 'Fund Holdings as of' not found or blank in {filename}, using file timestamp")
         timestamp_reported = timestamp_observed
     
+    if holdings:
+        ensure_holdings_partition(conn, timestamp_reported)
+    
     # Now update the database
     with conn.cursor() as cur:
         # Check if the fund already exists
@@ -181,12 +275,326 @@ def process_file(conn, filepath):
                         timestamp_reported
                     ))
                 print(f"Inserted {len(holdings)} holdings for {fund_symbol} as of {timestamp_reported.date()}")
+                
+                # Store concentration stats for this report alongside its holdings
+                stats = compute_fund_stats(holdings)
+                cur.execute("""
+                    INSERT INTO fund_stats
+                    (fund_id, timestamp_reported, num_holdings, top10_weight, hhi, weight_sum)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (fund_id, timestamp_reported) DO NOTHING
+                """, (
+                    fund_id,
+                    timestamp_reported,
+                    stats['num_holdings'],
+                    stats['top10_weight'],
+                    stats['hhi'],
+                    stats['weight_sum']
+                ))
+                
+                # Keep is_latest pointing at this fund's newest report
+                cur.execute("""
+                    UPDATE fund_stats
+                    SET is_latest = (timestamp_reported = (
+                        SELECT MAX(timestamp_reported) FROM fund_stats WHERE fund_id = %s
+                    ))
+                    WHERE fund_id = %s
+                """, (fund_id, fund_id))
+                
+                if not weight_sum_within_tolerance(stats):
+                    print(f"Warning: holdings weights for {fund_symbol} as of {timestamp_reported.date()} "
+                          f"sum to {stats['weight_sum']:.2%}")
         else:
             print(f"No holdings found for {fund_symbol} as of {timestamp_reported.date()}")
         
         conn.commit()
 
+def connect():
+    """Open a connection to the database."""
+    return psycopg2.connect(
+        host=DB_HOST,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD
+    )
+
+def connection_lost(conn, error):
+    """Return True if error means the connection itself is unusable."""
+    return bool(conn.closed) or isinstance(error, psycopg2.InterfaceError)
+
+def is_archive(path):
+    """Return True if the path names an archive we know how to stream."""
+    return path.lower().endswith(ARCHIVE_SUFFIXES)
+
+# Errors raised while reading a damaged, truncated or unsupported archive.
+# zipfile raises RuntimeError for encrypted members and NotImplementedError (a
+# RuntimeError) for unsupported compression methods such as deflate64.
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError, zlib.error, RuntimeError)
+
+def iter_archive_members(archive_path):
+    """Yield (filename, data, timestamp_observed) for holdings files in an archive.
+    
+    Members are read one at a time straight out of the archive, so nothing is
+    extracted to disk and only one member is held in memory at a time. The
+    data is returned as bytes so that each member can be decoded (and fail)
+    on its own.
+    """
+    if archive_path.lower().endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or not re.match(FILE_PATTERN, name):
+                    continue
+                with zf.open(info) as member:
+                    data = member.read()
+                yield name, data, datetime(*info.date_time)
+    else:
+        # Stream mode ("r|gz") reads the tarball sequentially without seeking
+        with tarfile.open(archive_path, "r|gz") as tf:
+            for info in tf:
+                name = os.path.basename(info.name)
+                if not info.isfile() or not re.match(FILE_PATTERN, name):
+                    continue
+                data = tf.extractfile(info).read()
+                yield name, data, datetime.fromtimestamp(info.mtime)
+
+def process_archive(conn, archive_path):
+    """Process every holdings file inside a .zip or .tar.gz archive."""
+    archive_name = os.path.basename(archive_path)
+    count = 0
+    for filename, data, timestamp_observed in iter_archive_members(archive_path):
+        print(f"Processing {archive_name}:{filename}...")
+        try:
+            process_content(conn, filename, data.decode('utf-8'), timestamp_observed)
+            count += 1
+        except Exception as e:
+            if connection_lost(conn, e):
+                raise
+            print(f"Error processing {archive_name}:{filename}: {e}")
+            conn.rollback()
+    print(f"Processed {count} files from {archive_name}")
+
+def process_path(conn, filepath):
+    """Process a loose holdings file or an archive of holdings files.
+    
+    Problems with the file itself are reported and skipped. Returns False if an
+    archive could not be read (it may still be being written), True otherwise.
+    If the database connection is lost the error is re-raised, so the caller
+    can reconnect.
+    """
+    filename = os.path.basename(filepath)
+    if is_archive(filepath):
+        try:
+            process_archive(conn, filepath)
+        except ARCHIVE_ERRORS as e:
+            print(f"Error reading archive {filename}: {e}")
+            conn.rollback()
+            return False
+    elif re.match(FILE_PATTERN, filename):
+        print(f"Processing {filename}...")
+        try:
+            process_file(conn, filepath)
+        except Exception as e:
+            if connection_lost(conn, e):
+                raise
+            print(f"Error processing {filename}: {e}")
+            conn.rollback()
+    return True
+
+def find_input_files(data_dir):
+    """Return all holdings files and archives in data_dir."""
+    file_paths = glob.glob(os.path.join(data_dir, "*-holdings.csv"))
+    for suffix in ARCHIVE_SUFFIXES:
+        file_paths.extend(glob.glob(os.path.join(data_dir, "*" + suffix)))
+    return sorted(file_paths)
+
+def is_input_file(filename):
+    """Return True if filename is a holdings file or archive we should ingest."""
+    return bool(re.match(FILE_PATTERN, filename)) or is_archive(filename)
+
+class Inotify:
+    """Minimal Linux inotify(7) watch on one directory, via ctypes.
+    
+    Reports entries created in, moved into, deleted from or moved out of the
+    directory, so new arrivals are found without listing the directory.
+    """
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    
+    EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+    
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_CREATE | self.IN_MOVED_TO | self.IN_DELETE | self.IN_MOVED_FROM
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+    
+    def read_events(self, timeout):
+        """Wait up to timeout seconds and return a list of (mask, name) events."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        
+        events = []
+        offset = 0
+        while offset < len(buf):
+            _, mask, _, length = self.EVENT_HEADER.unpack_from(buf, offset)
+            offset += self.EVENT_HEADER.size
+            name = buf[offset:offset + length].rstrip(b"\0").decode(errors="surrogateescape")
+            offset += length
+            events.append((mask, name))
+        return events
+    
+    def close(self):
+        os.close(self.fd)
+
+def reconnect(conn, interval):
+    """Replace a broken connection, retrying every interval seconds until it works."""
+    try:
+        conn.close()
+    except psycopg2.Error:
+        pass
+    
+    while True:
+        try:
+            conn = connect()
+            print("Reconnected to database")
+            return conn
+        except psycopg2.Error as e:
+            print(f"Error reconnecting to database, retrying in {interval}s: {e}")
+            time.sleep(interval)
+
+def watch(conn, data_dir, interval=WATCH_INTERVAL, debounce=WATCH_DEBOUNCE, use_inotify=True):
+    """Ingest the files in data_dir, then new files as they arrive, until interrupted.
+    
+    Every file, including those present at startup, is held as pending and
+    re-stat'ed individually until its size and mtime have been stable for
+    `debounce` seconds, so partially written files are not ingested. An archive
+    that cannot be read (e.g. an upload that paused for longer than `debounce`)
+    stays pending and is retried once its size or mtime changes again.
+    
+    New arrivals are found with inotify where available, which never lists
+    the directory. Otherwise (non-Linux, or use_inotify=False for network
+    filesystems where inotify does not see remote writes) the directory is
+    polled: it is only listed when its own mtime changes, at a cost of one
+    listing per check interval in which files arrived, however many arrived.
+    
+    If the database connection drops, it is re-opened and the file retried.
+    The connection is closed on return.
+    """
+    notifier = None
+    if use_inotify:
+        try:
+            # Start watching before the initial listing so nothing arriving in between is missed
+            notifier = Inotify(data_dir)
+        except (OSError, AttributeError) as e:
+            print(f"inotify not available ({e}), polling {data_dir} instead")
+    
+    seen = set()
+    # filename -> (size, mtime, time first seen with that size/mtime), where the
+    # time is None for an archive that failed to read at that size/mtime
+    pending = {}
+    
+    def add_pending(name, now):
+        if name in seen or name in pending or not is_input_file(name):
+            return
+        try:
+            st = os.stat(os.path.join(data_dir, name))
+        except FileNotFoundError:
+            return
+        pending[name] = (st.st_size, st.st_mtime_ns, now)
+    
+    def rescan(now):
+        nonlocal seen
+        names = {entry.name for entry in os.scandir(data_dir) if entry.is_file()}
+        # Forget files that were removed so a re-delivered file is ingested again
+        seen &= names
+        for name in names:
+            add_pending(name, now)
+    
+    dir_mtime = os.stat(data_dir).st_mtime_ns
+    rescan(time.monotonic())
+    print(f"Found {len(pending)} files to process")
+    print(f"Watching {data_dir} for new files (Ctrl-C to stop)")
+    
+    try:
+        while True:
+            if notifier:
+                events = notifier.read_events(interval)
+                now = time.monotonic()
+                for mask, name in events:
+                    if mask & Inotify.IN_Q_OVERFLOW:
+                        # Events were dropped; fall back to one listing to catch up
+                        rescan(now)
+                    elif mask & (Inotify.IN_DELETE | Inotify.IN_MOVED_FROM):
+                        seen.discard(name)
+                        pending.pop(name, None)
+                    else:
+                        # A new file at this name, even if an older one was ingested
+                        seen.discard(name)
+                        add_pending(name, now)
+            else:
+                time.sleep(interval)
+                now = time.monotonic()
+                current_dir_mtime = os.stat(data_dir).st_mtime_ns
+                if current_dir_mtime != dir_mtime:
+                    dir_mtime = current_dir_mtime
+                    rescan(now)
+            
+            for filename, (size, mtime, stable_since) in list(pending.items()):
+                filepath = os.path.join(data_dir, filename)
+                try:
+                    st = os.stat(filepath)
+                except FileNotFoundError:
+                    del pending[filename]
+                    continue
+                
+                if (st.st_size, st.st_mtime_ns) != (size, mtime):
+                    # Still being written; restart the debounce window
+                    pending[filename] = (st.st_size, st.st_mtime_ns, now)
+                elif stable_since is not None and now - stable_since >= debounce:
+                    try:
+                        readable = process_path(conn, filepath)
+                    except psycopg2.Error as e:
+                        # Leave the file pending so it is retried on the new connection
+                        print(f"Lost database connection while processing {filename}: {e}")
+                        conn = reconnect(conn, interval)
+                        continue
+                    if not readable:
+                        # Wait for the file to change before trying it again
+                        pending[filename] = (size, mtime, None)
+                        continue
+                    del pending[filename]
+                    seen.add(filename)
+    finally:
+        if notifier:
+            notifier.close()
+        conn.close()
+
 def main():
+    parser = argparse.ArgumentParser(description="Ingest ETF holdings files into the database")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and ingest new files as they arrive, after those already present")
+    parser.add_argument("--poll", action="store_true",
+                        help="In watch mode, poll DATA_DIR instead of using inotify (e.g. on network filesystems)")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL,
+                        help="Seconds between checks in watch mode")
+    parser.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE,
+                        help="Seconds a file must go unchanged before it is ingested in watch mode")
+    args = parser.parse_args()
+    
     # Check for required environment variables
     if not DB_HOST:
         print("Error: DB_HOST environment variable is not set")
@@ -198,36 +606,35 @@ def main():
     
     # Connect to the database
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
+        conn = connect()
     except psycopg2.Error as e:
         print(f"Error connecting to database: {e}")
         return
     
-    # Find all files matching the pattern
-    file_paths = glob.glob(os.path.join(DATA_DIR, "*-holdings.csv"))
+    if args.watch:
+        # Existing files go through the same stability check as new ones
+        try:
+            watch(conn, DATA_DIR, interval=args.interval, debounce=args.debounce,
+                  use_inotify=not args.poll)
+        except KeyboardInterrupt:
+            print("Stopped watching")
+        return
+    
+    # Find all holdings files and archives
+    file_paths = find_input_files(DATA_DIR)
     
     print(f"Found {len(file_paths)} files to process")
     
     # Process each file
     for filepath in file_paths:
-        filename = os.path.basename(filepath)
-        if re.match(FILE_PATTERN, filename):
-            print(f"Processing {filename}...")
-            try:
-                process_file(conn, filepath)
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
-                conn.rollback()
+        try:
+            process_path(conn, filepath)
+        except psycopg2.Error as e:
+            print(f"Lost database connection while processing {os.path.basename(filepath)}: {e}")
+            break
     
     conn.close()
     print("Processing complete")
 
 if __name__ == "__main__":
     main()
-
-
@@ -0,0 +1,10 @@
+#!/bin/bash
+# Allow the read replica in docker-compose-local.yml to stream WAL from this
+# database. Runs once, when the primary's data volume is first initialised.
+set -e
+
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-EOSQL
+    CREATE ROLE replicator WITH REPLICATION LOGIN PASSWORD '$REPLICATION_PASSWORD';
+EOSQL
+
+echo "host replication replicator all md5" >> "$PGDATA/pg_hba.conf"
@@ -9,22 +9,62 @@ CREATE TABLE fund_info (
     issuer VARCHAR(255) NOT NULL
 );
 
--- Create the holdings table
+-- Create the holdings table, range-partitioned by report date so that old years
+-- can be detached without touching current data
 CREATE TABLE holdings (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     fund_id VARCHAR(50) NOT NULL,
     holding_name VARCHAR(255) NOT NULL,
     holding_symbol VARCHAR(20) NOT NULL,
     percent DECIMAL(10, 4) NOT NULL,
     timestamp_observed TIMESTAMP NOT NULL,
     timestamp_reported TIMESTAMP NOT NULL,
+    PRIMARY KEY (id, timestamp_reported),
     FOREIGN KEY (fund_id) REFERENCES fund_info(fund_id)
-);
+) PARTITION BY RANGE (timestamp_reported);
+
+-- Reports outside every yearly partition land here
+CREATE TABLE holdings_default PARTITION OF holdings DEFAULT;
+
+-- Create yearly partitions from 2023 (the year of the sample holdings below) through next year.
+-- etf_processor.py creates the partition for any other year before loading reports into it.
+DO $$
+DECLARE
+    y INTEGER;
+BEGIN
+    FOR y IN 2023 .. EXTRACT(YEAR FROM NOW())::INTEGER + 1 LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF holdings FOR VALUES FROM (%L) TO (%L)',
+            'holdings_' || y, make_date(y, 1, 1), make_date(y + 1, 1, 1)
+        );
+    END LOOP;
+END
+$$;
 
 -- Create indexes for better performance
-CREATE INDEX idx_holdings_fund_id ON holdings(fund_id);
+CREATE INDEX idx_fund_info_fund_symbol ON fund_info(fund_symbol);
+CREATE INDEX idx_holdings_fund_id_reported ON holdings(fund_id, timestamp_reported);
 CREATE INDEX idx_holdings_holding_symbol ON holdings(holding_symbol);
 
+-- Create the fund_stats table: concentration statistics computed once per
+-- (fund, report date) at ingest time. is_latest marks each fund's newest report
+-- so fund listings can be ranked from the partial indexes below.
+CREATE TABLE fund_stats (
+    fund_id VARCHAR(50) NOT NULL,
+    timestamp_reported TIMESTAMP NOT NULL,
+    num_holdings INTEGER NOT NULL,
+    top10_weight DECIMAL(10, 6) NOT NULL,
+    hhi DECIMAL(12, 10) NOT NULL,
+    weight_sum DECIMAL(10, 6) NOT NULL,
+    is_latest BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (fund_id, timestamp_reported),
+    FOREIGN KEY (fund_id) REFERENCES fund_info(fund_id)
+);
+
+CREATE INDEX idx_fund_stats_latest_hhi ON fund_stats(hhi) WHERE is_latest;
+CREATE INDEX idx_fund_stats_latest_top10_weight ON fund_stats(top10_weight) WHERE is_latest;
+CREATE INDEX idx_fund_stats_latest_num_holdings ON fund_stats(num_holdings) WHERE is_latest;
+
 -- Insert sample data
 INSERT INTO fund_info (fund_id, fund_symbol, fund_name, inception_date, issuer)
 VALUES ('4220', 'PLTL', 'Principal US Small-Cap Adaptive Multi-Factor ETF', '2021-05-19', 'Principal');
@@ -38,3 +78,6 @@ VALUES
 ('4220', 'Apple Inc.', 'AAPL', 0.0057, '2023-10-12 00:00:00', '2023-10-11 00:00:00'),
 ('4220', 'Microsoft Corporation', 'MSFT', 0.0042, '2023-10-12 00:00:00', '2023-10-11 00:00:00');
 
+-- Insert sample fund stats, matching the sample holdings
+INSERT INTO fund_stats (fund_id, timestamp_reported, num_holdings, top10_weight, hhi, weight_sum, is_latest)
+VALUES ('4220', '2023-10-11 00:00:00', 5, 0.0330, 0.00023, 0.0330, TRUE);
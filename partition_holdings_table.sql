@@ -0,0 +1,80 @@
+-- Migration script to convert the holdings table created by create_tables.sql into a
+-- table range-partitioned by timestamp_reported (one partition per year).
+--
+-- Point-in-time queries ("latest report on or before a date") become a seek on the
+-- (fund_id, timestamp_reported) index, and old years can later be detached with:
+--   ALTER TABLE holdings DETACH PARTITION holdings_2021;
+--
+-- Requires PostgreSQL 12 or later. Runs in a single transaction.
+
+BEGIN;
+
+-- Move the existing table out of the way. Its primary key index and sequence would
+-- otherwise collide with the names used by the new table.
+ALTER TABLE holdings RENAME TO holdings_unpartitioned;
+ALTER TABLE holdings_unpartitioned RENAME CONSTRAINT holdings_pkey TO holdings_unpartitioned_pkey;
+DROP INDEX IF EXISTS idx_holdings_fund_id;
+DROP INDEX IF EXISTS idx_holdings_holding_symbol;
+
+-- Create the partitioned holdings table. The partition key has to be part of the
+-- primary key, and the existing id sequence is reused so ids keep counting up.
+CREATE TABLE holdings (
+    id INTEGER NOT NULL DEFAULT nextval('holdings_id_seq'),
+    fund_id VARCHAR(50) NOT NULL,
+    holding_name VARCHAR(255) NOT NULL,
+    holding_symbol VARCHAR(20) NOT NULL,
+    percent DECIMAL(10, 4) NOT NULL,
+    timestamp_observed TIMESTAMP NOT NULL,
+    timestamp_reported TIMESTAMP NOT NULL,
+    PRIMARY KEY (id, timestamp_reported),
+    FOREIGN KEY (fund_id) REFERENCES fund_info(fund_id)
+) PARTITION BY RANGE (timestamp_reported);
+
+-- Reports that fall outside every yearly partition land here
+CREATE TABLE holdings_default PARTITION OF holdings DEFAULT;
+
+-- One partition per year, from the oldest report on file through next year
+DO $$
+DECLARE
+    y INTEGER;
+BEGIN
+    FOR y IN
+        SELECT generate_series(
+            COALESCE(MIN(EXTRACT(YEAR FROM timestamp_reported))::INTEGER, EXTRACT(YEAR FROM NOW())::INTEGER),
+            GREATEST(MAX(EXTRACT(YEAR FROM timestamp_reported))::INTEGER, EXTRACT(YEAR FROM NOW())::INTEGER + 1)
+        )
+        FROM holdings_unpartitioned
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF holdings FOR VALUES FROM (%L) TO (%L)',
+            'holdings_' || y, make_date(y, 1, 1), make_date(y + 1, 1, 1)
+        );
+    END LOOP;
+END
+$$;
+
+-- Copy the existing data across
+INSERT INTO holdings (id, fund_id, holding_name, holding_symbol, percent, timestamp_observed, timestamp_reported)
+SELECT id, fund_id, holding_name, holding_symbol, percent, timestamp_observed, timestamp_reported
+FROM holdings_unpartitioned;
+
+ALTER SEQUENCE holdings_id_seq OWNED BY holdings.id;
+DROP TABLE holdings_unpartitioned;
+
+-- Create indexes (created on every partition automatically)
+CREATE INDEX idx_holdings_fund_id_reported ON holdings(fund_id, timestamp_reported);
+CREATE INDEX idx_holdings_holding_symbol ON holdings(holding_symbol);
+
+COMMIT;
+
+ANALYZE holdings;
+
+-- Verify the result
+SELECT inhrelid::regclass AS partition, pg_get_expr(c.relpartbound, c.oid) AS bounds
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = 'holdings'::regclass
+ORDER BY 1;
+
+-- Done
+SELECT 'Migration complete: holdings is now partitioned by timestamp_reported' as result;
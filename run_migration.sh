@@ -3,9 +3,12 @@
 # Load database connection details from .env file
 source .env
 
+# Migration script to run (defaults to the original fund_info migration)
+MIGRATION_FILE=${1:-alter_fund_info_table.sql}
+
 # Run the migration script
 export PGPASSWORD=$DB_PASSWORD
-psql -h $DB_HOST -U $DB_USER -d $DB_NAME -f alter_fund_info_table.sql
+psql -h $DB_HOST -U $DB_USER -d $DB_NAME -f $MIGRATION_FILE
 
 echo "Migration script executed successfully"
 
@@ -0,0 +1,32 @@
+# test_etf_processor.py
+from decimal import Decimal
+
+from etf_processor import compute_fund_stats, weight_sum_within_tolerance
+
+def make_holdings(percents):
+    return [
+        {'holding_name': f"Holding {i}", 'holding_symbol': f"H{i}", 'percent': percent}
+        for i, percent in enumerate(percents)
+    ]
+
+def test_compute_fund_stats():
+    stats = compute_fund_stats(make_holdings([0.25] * 4))
+    assert stats['num_holdings'] == 4
+    assert stats['top10_weight'] == Decimal("1.0000")
+    assert stats['hhi'] == Decimal("0.25")
+    assert stats['weight_sum'] == Decimal("1.0000")
+
+def test_compute_fund_stats_top10_uses_largest_weights():
+    stats = compute_fund_stats(make_holdings([0.01] * 10 + [0.9]))
+    assert stats['num_holdings'] == 11
+    assert stats['top10_weight'] == Decimal("0.9900")
+
+def test_compute_fund_stats_rounds_to_stored_precision():
+    # holdings.percent is DECIMAL(10, 4), which rounds half away from zero
+    stats = compute_fund_stats(make_holdings([0.00875, 0.00874999]))
+    assert stats['weight_sum'] == Decimal("0.0175")
+
+def test_weight_sum_within_tolerance():
+    assert weight_sum_within_tolerance(compute_fund_stats(make_holdings([0.6, 0.4])))
+    assert weight_sum_within_tolerance(compute_fund_stats(make_holdings([0.6, 0.39])))
+    assert not weight_sum_within_tolerance(compute_fund_stats(make_holdings([0.6, 0.3])))
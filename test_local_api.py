@@ -15,10 +15,41 @@ def test_get_fund_with_filtered_holdings():
     print(f"Status Code: {response.status_code}")
     print(f"Response: {response.json()}")
 
+def test_get_fund_as_of():
+    response = requests.get(f"{BASE_URL}/api/fund/PLTL", params={"as_of": "2023-10-11"})
+    print(f"Status Code: {response.status_code}")
+    print(f"Response: {response.json()}")
+
+def test_get_fund_history():
+    response = requests.get(f"{BASE_URL}/api/fund/PLTL/history")
+    print(f"Status Code: {response.status_code}")
+    print(f"Response: {response.json()}")
+
+def test_get_fund_stats():
+    response = requests.get(f"{BASE_URL}/api/fund/PLTL/stats")
+    print(f"Status Code: {response.status_code}")
+    print(f"Response: {response.json()}")
+
+def test_list_funds_by_concentration():
+    response = requests.get(f"{BASE_URL}/api/funds", params={"sort_by": "hhi", "limit": 10})
+    print(f"Status Code: {response.status_code}")
+    print(f"Response: {response.json()}")
+
 if __name__ == "__main__":
     print("Testing get fund with all holdings...")
     #test_get_fund_with_all_holdings()
     
     print("\nTesting get fund with filtered holdings...")
     test_get_fund_with_filtered_holdings()
-
+    
+    print("\nTesting get fund as of a past date...")
+    test_get_fund_as_of()
+    
+    print("\nTesting get fund report history...")
+    test_get_fund_history()
+    
+    print("\nTesting get fund stats...")
+    test_get_fund_stats()
+    
+    print("\nTesting list funds ranked by concentration...")
+    test_list_funds_by_concentration()